@@ -11,7 +11,7 @@ if hasattr(tokenizer, "apply_chat_template") and tokenizer.chat_template is not
         messages, tokenize=False, add_generation_prompt=True
     )
 
-with Profiler(sample_duration=100, num_samples=2) as profiler:
+with Profiler(sample_frequency_hz=19) as profiler:
     response = generate(model, tokenizer, prompt=prompt, verbose=True)
 
 profile = profiler.get_profile()
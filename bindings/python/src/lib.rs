@@ -1,3 +1,4 @@
+use pyo3::exceptions::PyValueError;
 use pyo3::prelude::*;
 use wattkit::{PowerProfile, Sampling, StartStopSampler};
 
@@ -66,7 +67,41 @@ impl PyPowerProfile {
 #[pymethods]
 impl Profiler {
     #[new]
-    fn new(sample_duration: u64, num_samples: usize) -> PyResult<Self> {
+    #[pyo3(signature = (sample_duration=None, num_samples=None, sample_frequency_hz=None))]
+    fn new(
+        sample_duration: Option<u64>,
+        num_samples: Option<usize>,
+        sample_frequency_hz: Option<u64>,
+    ) -> PyResult<Self> {
+        let (sample_duration, num_samples) = match (sample_duration, sample_frequency_hz) {
+            (Some(duration), None) => (duration, num_samples.unwrap_or(1)),
+            (None, Some(hz)) => {
+                if hz == 0 || hz > 1000 {
+                    // The sampler works in whole milliseconds
+                    return Err(PyValueError::new_err(
+                        "sample_frequency_hz must be between 1 and 1000",
+                    ));
+                }
+                if num_samples.is_some() {
+                    return Err(PyValueError::new_err(
+                        "num_samples cannot be combined with sample_frequency_hz",
+                    ));
+                }
+                // One sample per period, the number of samples scales with the profiled scope
+                ((1000 + hz / 2) / hz, 1)
+            }
+            (Some(_), Some(_)) => {
+                return Err(PyValueError::new_err(
+                    "Specify either sample_duration or sample_frequency_hz, not both",
+                ))
+            }
+            (None, None) => {
+                return Err(PyValueError::new_err(
+                    "Either sample_duration or sample_frequency_hz is required",
+                ))
+            }
+        };
+
         Ok(Profiler {
             sampler: StartStopSampler::new(),
             sample_duration,
@@ -1,39 +1,157 @@
+import ctypes
+import functools
 import subprocess
 import re
 
+BATTERY_KEYS = (
+    "AppleRawMaxCapacity",
+    "AppleRawCurrentCapacity",
+    "Voltage",
+    "Temperature",
+    "CycleCount",
+    "IsCharging",
+)
+
+IOREG_PATTERN = re.compile(
+    rb'"(' + "|".join(BATTERY_KEYS).encode() + rb')" = (?:(\d+)|"?(Yes|No)"?)'
+)
+
+IOKIT_PATH = "/System/Library/Frameworks/IOKit.framework/IOKit"
+COREFOUNDATION_PATH = "/System/Library/Frameworks/CoreFoundation.framework/CoreFoundation"
+
+kIOMasterPortDefault = 0
+kCFStringEncodingUTF8 = 0x08000100
+kCFNumberSInt64Type = 4
+
+@functools.lru_cache(maxsize=None)
+def _load_frameworks():
+    iokit = ctypes.CDLL(IOKIT_PATH)
+    cf = ctypes.CDLL(COREFOUNDATION_PATH)
+
+    iokit.IOServiceMatching.restype = ctypes.c_void_p
+    iokit.IOServiceMatching.argtypes = [ctypes.c_char_p]
+    iokit.IOServiceGetMatchingService.restype = ctypes.c_uint32
+    iokit.IOServiceGetMatchingService.argtypes = [ctypes.c_uint32, ctypes.c_void_p]
+    iokit.IORegistryEntryCreateCFProperties.restype = ctypes.c_int
+    iokit.IORegistryEntryCreateCFProperties.argtypes = [
+        ctypes.c_uint32, ctypes.POINTER(ctypes.c_void_p), ctypes.c_void_p, ctypes.c_uint32
+    ]
+    iokit.IOObjectRelease.argtypes = [ctypes.c_uint32]
+
+    cf.CFStringCreateWithCString.restype = ctypes.c_void_p
+    cf.CFStringCreateWithCString.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_uint32]
+    cf.CFDictionaryGetValue.restype = ctypes.c_void_p
+    cf.CFDictionaryGetValue.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    cf.CFGetTypeID.restype = ctypes.c_ulong
+    cf.CFGetTypeID.argtypes = [ctypes.c_void_p]
+    cf.CFBooleanGetTypeID.restype = ctypes.c_ulong
+    cf.CFBooleanGetValue.restype = ctypes.c_bool
+    cf.CFBooleanGetValue.argtypes = [ctypes.c_void_p]
+    cf.CFNumberGetTypeID.restype = ctypes.c_ulong
+    cf.CFNumberGetValue.restype = ctypes.c_bool
+    cf.CFNumberGetValue.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p]
+    cf.CFRelease.argtypes = [ctypes.c_void_p]
+
+    return iokit, cf
+
+def _battery_properties_iokit():
+    """
+    Read AppleSmartBattery properties straight from the IORegistry,
+    no ioreg subprocess or text parsing involved
+    """
+    iokit, cf = _load_frameworks()
+
+    service = iokit.IOServiceGetMatchingService(
+        kIOMasterPortDefault, iokit.IOServiceMatching(b"AppleSmartBattery")
+    )
+    if not service:
+        raise OSError("AppleSmartBattery service not found")
+
+    props = ctypes.c_void_p()
+    try:
+        kr = iokit.IORegistryEntryCreateCFProperties(service, ctypes.byref(props), None, 0)
+        if kr != 0 or not props:
+            raise OSError(f"IORegistryEntryCreateCFProperties failed: {kr}")
+    finally:
+        iokit.IOObjectRelease(service)
+
+    boolean_type = cf.CFBooleanGetTypeID()
+    number_type = cf.CFNumberGetTypeID()
+    properties = {}
+    try:
+        for key in BATTERY_KEYS:
+            cf_key = cf.CFStringCreateWithCString(None, key.encode(), kCFStringEncodingUTF8)
+            value = cf.CFDictionaryGetValue(props, cf_key)
+            cf.CFRelease(cf_key)
+            if not value:
+                continue
+            type_id = cf.CFGetTypeID(value)
+            if type_id == boolean_type:
+                properties[key] = cf.CFBooleanGetValue(value)
+            elif type_id == number_type:
+                number = ctypes.c_int64()
+                if cf.CFNumberGetValue(value, kCFNumberSInt64Type, ctypes.byref(number)):
+                    properties[key] = number.value
+    finally:
+        cf.CFRelease(props)
+
+    return properties
+
+def _battery_properties_ioreg():
+    """
+    Fallback for when IOKit can't be loaded, parses the output of ioreg
+    """
+    # Run ioreg command to get battery information
+    cmd = ["ioreg", "-r", "-c", "AppleSmartBattery"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # Extract values line by line, stop reading once every key is found
+    props = {}
+    try:
+        for line in proc.stdout:
+            for match in IOREG_PATTERN.finditer(line):
+                key = match.group(1).decode()
+                if key in props:
+                    continue
+                if match.group(2) is not None:
+                    props[key] = int(match.group(2))
+                elif match.group(3) is not None:
+                    props[key] = match.group(3) == b"Yes"
+            if len(props) == len(BATTERY_KEYS):
+                break
+        else:
+            proc.wait()
+            if proc.returncode != 0:
+                stderr = proc.stderr.read().decode(errors='replace')
+                raise RuntimeError(f"Error running ioreg: {stderr}")
+    finally:
+        proc.kill()
+        proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+    return props
+
 def get_battery_info():
     """
-    Get battery capacity and current state information using ioreg on macOS
+    Get battery capacity and current state information from IOKit on macOS
     Returns capacity in Watt-hours and current state
     """
     try:
-        # Run ioreg command to get battery information
-        cmd = ["ioreg", "-r", "-c", "AppleSmartBattery"]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            return f"Error running ioreg: {result.stderr}"
-
-        output = result.stdout
-        
-        # Extract values using regex
-        def extract_value(pattern):
-            match = re.search(pattern + r'" = (\d+)', output)
-            return int(match.group(1)) if match else 0
-            
-        def extract_string(pattern):
-            match = re.search(pattern + r'" = \"([^"]+)\"', output)
-            return match.group(1) if match else "Unknown"
+        try:
+            props = _battery_properties_iokit()
+        except OSError:
+            props = _battery_properties_ioreg()
 
         # Get design values
-        max_capacity = extract_value('"AppleRawMaxCapacity')
-        current_capacity = extract_value('"AppleRawCurrentCapacity')
+        max_capacity = props.get("AppleRawMaxCapacity", 0)
+        current_capacity = props.get("AppleRawCurrentCapacity", 0)
         
         # Get current state
-        voltage_now = extract_value('"Voltage') / 1000.0  # Current voltage in V
-        temperature = extract_value('"Temperature') / 100.0  # Temperature in Celsius
-        cycle_count = extract_value('"CycleCount')
-        charging = extract_string('"IsCharging')
+        voltage_now = props.get("Voltage", 0) / 1000.0  # Current voltage in V
+        temperature = props.get("Temperature", 0) / 100.0  # Temperature in Celsius
+        cycle_count = props.get("CycleCount", 0)
+        charging = props.get("IsCharging", False)
         
         max_capacity_wh = (max_capacity * voltage_now) / 1000
         current_wh = (current_capacity * voltage_now) / 1000
@@ -47,7 +165,7 @@ def get_battery_info():
                 'percentage': round(current_capacity / max_capacity * 100, 1),
             },
             'state': {
-                'charging': charging == "Yes",
+                'charging': charging,
                 'cycles': cycle_count,
                 'temperature': temperature
             }